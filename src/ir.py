@@ -20,3 +20,12 @@ class Instruction:
 
     def __repr__(self):
         return f"Instruction(op={self.op}, args={self.args})"
+
+class FunctionSignature:
+    def __init__(self, name, params, entry):
+        self.name = name
+        self.params = params
+        self.entry = entry
+
+    def __repr__(self):
+        return f"FunctionSignature(name={self.name}, params={self.params}, entry={self.entry})"
@@ -1,5 +1,5 @@
 from parser import Program, Declaration, Assignment, IfStatement, WhileStatement, ReturnStatement, FunctionCall, Expression, FunctionDeclaration
-from ir import IR, BasicBlock, Instruction
+from ir import IR, BasicBlock, Instruction, FunctionSignature
 
 class IRGenerator:
     def __init__(self):
@@ -7,6 +7,7 @@ class IRGenerator:
         self.current_block = None
         self.block_counter = 0
         self.temp_counter = 0
+        # Only signatures are kept, so lowering one function never pins another's blocks.
         self.functions = {}
 
     def new_block(self):
@@ -18,7 +19,8 @@ class IRGenerator:
         return block
 
     def new_temp(self):
-        temp_name = f"t{self.temp_counter}"
+        # '%' can't start an identifier, so a temp never collides with a source variable.
+        temp_name = f"%t{self.temp_counter}"
         self.temp_counter += 1
         return temp_name
 
@@ -29,7 +31,29 @@ class IRGenerator:
             raise Exception(f"Unsupported node type: {type(node)}")
         return self.ir
 
+    def generate_unit(self, node):
+        """Lowers one function or the main program into a fresh IR.
+
+        Block labels and temps keep counting across calls, so the units of one program
+        can be lowered, emitted and dropped one at a time.
+        """
+        self.ir = IR()
+        self.current_block = None
+        if isinstance(node, FunctionDeclaration):
+            self.visit_function_declaration(node)
+        elif isinstance(node, Program):
+            self.visit_program(node)
+        else:
+            raise Exception(f"Unsupported node type: {type(node)}")
+        ir = self.ir
+        # Hand the unit over entirely so the generator doesn't keep it alive.
+        self.ir = None
+        self.current_block = None
+        return ir
+
     def visit_program(self, node):
+        for func in node.functions:
+            self.visit(func)
         self.new_block()
         for decl in node.declarations:
             self.visit(decl)
@@ -92,7 +116,7 @@ class IRGenerator:
 
     def visit_function_declaration(self, node):
         entry_block = self.new_block()
-        self.functions[node.name] = entry_block
+        self.functions[node.name] = FunctionSignature(node.name, node.params, entry_block.label)
         self.current_block = entry_block
         for param in node.params:
             param_var = self.new_temp()
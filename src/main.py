@@ -0,0 +1,91 @@
+import argparse
+import sys
+
+from tokenizer import Tokenizer
+from parser import Parser
+from ir_generator import IRGenerator
+from optimizer import PeepholeOptimizer
+from pipeline import StreamingCompiler
+
+STAGES = ('tokens', 'ast', 'ir')
+
+def compile_source(code, stage='ir', optimizer=None):
+    tokens = Tokenizer(code).tokenize()
+    if stage == 'tokens':
+        return tokens
+    ast = Parser(tokens).parse()
+    if stage == 'ast':
+        return ast
+    ir = IRGenerator().generate(ast)
+    if optimizer:
+        optimizer.optimize(ir)
+    return ir
+
+def check_source(code):
+    """Parses in recovery mode, returning the partial AST and every diagnostic in source order."""
+    tokenizer = Tokenizer(code, recover=True)
+    parser = Parser(tokenizer.tokenize(), recover=True)
+    ast = parser.parse()
+    diagnostics = sorted(tokenizer.errors + parser.errors, key=lambda d: (d.line, d.column))
+    return ast, diagnostics
+
+def format_result(result, stage='ir'):
+    if stage == 'tokens':
+        return '\n'.join(repr(token) for token in result)
+    if stage == 'ast':
+        return repr(result)
+    return '\n'.join(repr(block) for block in result.basic_blocks)
+
+def stream(path, optimizer=None):
+    # The tokenizer reads the file a line at a time, so the source is never held whole either.
+    with (open(path) if path else sys.stdin) as f:
+        try:
+            for name, ir in StreamingCompiler(optimizer).compile(f):
+                print(f"# {name}")
+                print(format_result(ir))
+        except Exception as e:
+            print(e, file=sys.stderr)
+            return 1
+    if optimizer:
+        print(optimizer.report(), file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compile a tiny program and print the result.")
+    arg_parser.add_argument('file', nargs='?', help="source file (reads stdin if omitted)")
+    arg_parser.add_argument('--stage', choices=STAGES, default='ir', help="stop after this stage")
+    arg_parser.add_argument('-O', '--optimize', action='store_true', help="run the peephole optimizer and report how often each rule fired")
+    arg_parser.add_argument('--stream', action='store_true', help="compile and print one function at a time to bound memory use")
+    arg_parser.add_argument('--check', action='store_true', help="report every syntax error instead of stopping at the first")
+    args = arg_parser.parse_args(argv)
+    if args.optimize and args.stage != 'ir':
+        arg_parser.error("-O/--optimize only applies to --stage ir")
+
+    if args.stream:
+        return stream(args.file, PeepholeOptimizer() if args.optimize else None)
+
+    if args.file:
+        with open(args.file) as f:
+            code = f.read()
+    else:
+        code = sys.stdin.read()
+
+    if args.check:
+        _, diagnostics = check_source(code)
+        for diagnostic in diagnostics:
+            print(diagnostic, file=sys.stderr)
+        return 1 if diagnostics else 0
+
+    optimizer = PeepholeOptimizer() if args.optimize else None
+    try:
+        result = compile_source(code, args.stage, optimizer)
+    except Exception as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(format_result(result, args.stage))
+    if optimizer:
+        print(optimizer.report(), file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+from collections import Counter
+
+from ir import Instruction
+
+class Rule:
+    """A peephole rewrite: a window of instruction patterns and what replaces them.
+
+    Patterns are tuples of (op, *args). A string starting with '?' binds whatever is in
+    that position, a nested tuple matches a nested Instruction, and anything else must be
+    equal. The replacement uses the same notation with the bindings substituted. `where`
+    can reject a match or add bindings of its own.
+    """
+
+    def __init__(self, name, pattern, replacement, where=None):
+        self.name = name
+        self.pattern = pattern
+        self.replacement = replacement
+        self.where = where
+
+    def key(self):
+        return opcode_key(self.pattern[0])
+
+    def __repr__(self):
+        return f"Rule({self.name})"
+
+class Site:
+    # What a `where` clause can see besides the bindings.
+    def __init__(self, ir, block_index, end, uses, whole_program=True):
+        self.ir = ir
+        self.block_index = block_index
+        self.end = end
+        self.uses = uses
+        self.whole_program = whole_program
+
+    @property
+    def block(self):
+        return self.ir.basic_blocks[self.block_index]
+
+    @property
+    def next_block(self):
+        if self.block_index + 1 < len(self.ir.basic_blocks):
+            return self.ir.basic_blocks[self.block_index + 1]
+        return None
+
+def is_var(pattern):
+    return isinstance(pattern, str) and pattern.startswith('?')
+
+def opcode_key(instr):
+    # Rules are indexed by the opcode of their first instruction and, for an 'assign',
+    # by the opcode of the value being assigned.
+    if isinstance(instr, Instruction):
+        op, args = instr.op, instr.args
+    else:
+        op, args = instr[0], instr[1:]
+    inner = None
+    if op == 'assign' and len(args) == 2:
+        value = args[1]
+        if isinstance(value, Instruction):
+            inner = value.op
+        elif isinstance(value, tuple):
+            inner = value[0]
+    return op, inner
+
+def match(pattern, value, bindings):
+    if is_var(pattern):
+        if pattern in bindings:
+            return bindings[pattern] == value
+        bindings[pattern] = value
+        return True
+    if isinstance(pattern, tuple):
+        return (isinstance(value, Instruction) and value.op == pattern[0]
+                and len(value.args) == len(pattern) - 1
+                and all(match(p, v, bindings) for p, v in zip(pattern[1:], value.args)))
+    return type(pattern) is type(value) and pattern == value
+
+def build(template, bindings):
+    if is_var(template):
+        return bindings[template]
+    if isinstance(template, tuple):
+        return Instruction(template[0], *(build(arg, bindings) for arg in template[1:]))
+    return template
+
+def count_uses(ir):
+    uses = Counter()
+
+    def visit(arg):
+        if isinstance(arg, Instruction):
+            for inner in arg.args:
+                visit(inner)
+        elif isinstance(arg, str):
+            uses[arg] += 1
+
+    for block in ir.basic_blocks:
+        for instr in block.instructions:
+            # The first operand of these is the name being defined, not a use.
+            args = instr.args[1:] if instr.op in ('assign', 'param') else instr.args
+            for arg in args:
+                visit(arg)
+    return uses
+
+def power_of_two(bindings, site):
+    n = bindings['?n']
+    if isinstance(n, int) and n > 1 and n & (n - 1) == 0:
+        bindings['?k'] = n.bit_length() - 1
+        return True
+    return False
+
+def is_temp(name):
+    # IRGenerator.new_temp prefixes temps with '%', which no source identifier can contain.
+    return isinstance(name, str) and name.startswith('%')
+
+def single_use(bindings, site):
+    # Within one unit, only temps are known to have no readers elsewhere; a variable
+    # may be read by a function compiled before or after this one.
+    name = bindings['?t']
+    return site.uses[name] == 1 and (site.whole_program or is_temp(name))
+
+def jumps_to_next_block(bindings, site):
+    next_block = site.next_block
+    return site.end == len(site.block.instructions) and next_block is not None and next_block.label == bindings['?l']
+
+RULES = [
+    Rule('add-zero', [('assign', '?d', ('+', '?a', 0))], [('assign', '?d', '?a')]),
+    Rule('zero-add', [('assign', '?d', ('+', 0, '?a'))], [('assign', '?d', '?a')]),
+    Rule('sub-zero', [('assign', '?d', ('-', '?a', 0))], [('assign', '?d', '?a')]),
+    Rule('mul-one', [('assign', '?d', ('*', '?a', 1))], [('assign', '?d', '?a')]),
+    Rule('one-mul', [('assign', '?d', ('*', 1, '?a'))], [('assign', '?d', '?a')]),
+    Rule('div-one', [('assign', '?d', ('/', '?a', 1))], [('assign', '?d', '?a')]),
+    Rule('mul-pow2', [('assign', '?d', ('*', '?a', '?n'))], [('assign', '?d', ('<<', '?a', '?k'))], where=power_of_two),
+    Rule('pow2-mul', [('assign', '?d', ('*', '?n', '?a'))], [('assign', '?d', ('<<', '?a', '?k'))], where=power_of_two),
+    Rule('self-assign', [('assign', '?a', '?a')], []),
+    Rule('fold-copy', [('assign', '?t', '?e'), ('assign', '?d', '?t')], [('assign', '?d', '?e')], where=single_use),
+    Rule('jmp-next', [('jmp', '?l')], [], where=jumps_to_next_block),
+]
+
+class PeepholeOptimizer:
+    def __init__(self, rules=RULES):
+        self.rules = {}
+        for rule in rules:
+            self.rules.setdefault(rule.key(), []).append(rule)
+        self.window = max((len(rule.pattern) for rule in rules), default=1)
+        self.stats = Counter()
+
+    def candidates(self, instr):
+        op, inner = opcode_key(instr)
+        rules = self.rules.get((op, inner), [])
+        if inner is not None:
+            rules = rules + self.rules.get((op, None), [])
+        return rules
+
+    def optimize(self, ir, whole_program=True):
+        """Rewrites `ir` in place until no rule applies.
+
+        Pass whole_program=False when `ir` is one unit of a larger program, so use counts
+        of named variables are not taken to cover the whole program.
+        """
+        changed = True
+        while changed:
+            changed = False
+            uses = count_uses(ir)
+            for block_index, block in enumerate(ir.basic_blocks):
+                if self.optimize_block(ir, block_index, uses, whole_program):
+                    changed = True
+        return ir
+
+    def optimize_block(self, ir, block_index, uses, whole_program=True):
+        instructions = ir.basic_blocks[block_index].instructions
+        changed = False
+        i = 0
+        while i < len(instructions):
+            for rule in self.candidates(instructions[i]):
+                end = i + len(rule.pattern)
+                if end > len(instructions):
+                    continue
+                bindings = {}
+                if not all(match(p, instr, bindings) for p, instr in zip(rule.pattern, instructions[i:end])):
+                    continue
+                if rule.where and not rule.where(bindings, Site(ir, block_index, end, uses, whole_program)):
+                    continue
+                instructions[i:end] = [build(template, bindings) for template in rule.replacement]
+                self.stats[rule.name] += 1
+                changed = True
+                # Step back so windows that now overlap the rewrite are checked again.
+                i = max(i - self.window, -1)
+                break
+            i += 1
+        return changed
+
+    def report(self):
+        return '\n'.join(f"{name}: {count}" for name, count in self.stats.most_common())
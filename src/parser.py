@@ -1,14 +1,20 @@
-from tokenizer import Tokenizer
+from tokenizer import Tokenizer, Token, Diagnostic
+
+class ParseError(Exception):
+    pass
 
 class Node:
     pass
 
 class Program(Node):
-    def __init__(self, declarations, statements):
+    def __init__(self, declarations, statements, functions=None):
         self.declarations = declarations
         self.statements = statements
+        self.functions = functions or []
 
     def __repr__(self):
+        if self.functions:
+            return f"Program(functions={self.functions}, declarations={self.declarations}, statements={self.statements})"
         return f"Program(declarations={self.declarations}, statements={self.statements})"
 
 class Declaration(Node):
@@ -58,6 +64,15 @@ class FunctionCall(Node):
     def __repr__(self):
         return f"FunctionCall(func_name={self.func_name}, args={self.args})"
 
+class FunctionDeclaration(Node):
+    def __init__(self, name, params, body):
+        self.name = name
+        self.params = params
+        self.body = body
+
+    def __repr__(self):
+        return f"FunctionDeclaration(name={self.name}, params={self.params}, body={self.body})"
+
 class Expression(Node):
     def __init__(self, left, op=None, right=None):
         self.left = left
@@ -71,8 +86,22 @@ class Expression(Node):
             return f"Expression(value={self.left})"
 
 class Parser:
-    def __init__(self, tokens):
+    # Recovery resumes before a stopper unless it closes a construct opened inside
+    # the failed statement.
+    CLOSER_FOR = {('KEYWORD', 'if'): ('KEYWORD', 'fi'), ('KEYWORD', 'while'): ('KEYWORD', 'od'), ('LBRACE', '{'): ('RBRACE', '}')}
+    CLOSERS = set(CLOSER_FOR.values())
+    STOPPERS = CLOSERS | {('KEYWORD', 'else'), ('END', '.'), ('EOF', None)}
+
+    def __init__(self, tokens, recover=False):
+        self.recover = recover
+        self.errors = []
+        if recover:
+            # A sentinel keeps lookahead code from tripping over None at end of input.
+            last = tokens[-1] if tokens else Token('EOF', None, 1, 0)
+            tokens = tokens + [Token('EOF', None, last.line, last.column)]
         self.tokens = tokens
+        # Closers ('fi', 'od', '}') of the blocks currently being parsed, innermost last.
+        self.open_blocks = []
         self.current_token = None
         self.pos = -1
         self.next_token()
@@ -85,7 +114,50 @@ class Parser:
             self.current_token = None
 
     def error(self, message):
-        raise Exception(f"Error parsing input: {message}")
+        if not self.recover:
+            raise Exception(f"Error parsing input: {message}")
+        token = self.current_token
+        self.errors.append(Diagnostic(message, token.line, token.column))
+        raise ParseError(message)
+
+    def expect(self, token_type):
+        # In recovery mode a missing structural token is reported and treated as present.
+        try:
+            self.eat(token_type)
+        except ParseError:
+            pass
+
+    def synchronize(self, start_pos, error_pos, stoppers):
+        """Skips the rest of a failed statement, resuming after its ';' or before a closer.
+
+        Scanning restarts at the statement's first token so that an 'if', 'while' or '{'
+        the statement already consumed is matched with its closer instead of ending
+        the enclosing sequence early.
+        """
+        expected = []
+        self.pos = start_pos - 1
+        self.next_token()
+        while True:
+            key = (self.current_token.type, self.current_token.value)
+            if key in self.CLOSERS:
+                if key in expected:
+                    # Anything opened after the matching construct was left unterminated.
+                    del expected[len(expected) - expected[::-1].index(key) - 1:]
+                    self.next_token()
+                    continue
+                # A closer nothing in this statement opened belongs to the enclosing block.
+                expected.clear()
+            if not expected and self.pos >= error_pos:
+                if key in stoppers:
+                    return
+                if key[0] == 'SEMICOLON':
+                    self.next_token()
+                    return
+            if key in self.CLOSER_FOR:
+                expected.append(self.CLOSER_FOR[key])
+            elif key[0] == 'EOF':
+                return
+            self.next_token()
 
     def eat(self, token_type):
         if self.current_token and self.current_token.type == token_type:
@@ -93,40 +165,140 @@ class Parser:
         else:
             self.error(f"Expected token {token_type}, got {self.current_token}")
 
+    def eat_keyword(self, value):
+        if self.current_token and self.current_token.type == 'KEYWORD' and self.current_token.value == value:
+            self.next_token()
+        else:
+            self.error(f"Expected keyword {value}, got {self.current_token}")
+
+    def expect_keyword(self, value):
+        try:
+            self.eat_keyword(value)
+        except ParseError:
+            pass
+
+    def report(self, message):
+        # Records a diagnostic without unwinding, for errors the parser can repair in place.
+        token = self.current_token
+        self.errors.append(Diagnostic(message, token.line, token.column))
+
+    def end_block(self, keyword):
+        token = self.current_token
+        if self.recover and token.value in ('fi', 'od', '}') and token.value != keyword:
+            self.report(f"Expected keyword {keyword}, got {token}")
+            # A closer no enclosing block is waiting for is a typo for this one; otherwise
+            # this block's closer is simply missing and the token is left for its owner.
+            if token.value not in self.open_blocks:
+                self.next_token()
+            return
+        self.eat_keyword(keyword)
+
     def parse(self):
         return self.program()
 
     def program(self):
-        self.eat('KEYWORD')  # 'main'
+        functions = []
+        while self.current_token and self.current_token.type == 'KEYWORD' and self.current_token.value == 'function':
+            start_pos = self.pos
+            try:
+                functions.append(self.function_declaration())
+            except ParseError:
+                self.synchronize(start_pos, self.pos, self.STOPPERS)
+        self.expect_keyword('main')
+        declarations = self.declarations()
+        self.expect('LBRACE')
+        self.open_blocks.append('}')
+        try:
+            statements = self.statement_sequence()
+            self.expect('RBRACE')
+            while self.recover and self.current_token.type not in ('END', 'EOF'):
+                # More statements after the '}' mean it was a stray one; report it and carry on.
+                brace = self.tokens[self.pos - 1]
+                self.errors.append(Diagnostic(f"Unexpected {brace}", brace.line, brace.column))
+                statements.extend(self.statement_sequence())
+                self.expect('RBRACE')
+        finally:
+            self.open_blocks.pop()
+        self.expect('END')
+        if self.recover and self.current_token.type != 'EOF':
+            # Nothing may follow the program; one report covers whatever trails it.
+            self.report(f"Unexpected token after end of program: {self.current_token}")
+        return Program(declarations, statements, functions)
+
+    def function_declaration(self):
+        self.eat_keyword('function')
+        name = self.current_token.value
+        self.eat('IDENT')
+        self.eat('LPAREN')
+        params = []
+        if self.current_token.type == 'IDENT':
+            params.append(self.current_token.value)
+            self.eat('IDENT')
+            while self.current_token.type == 'COMMA':
+                self.eat('COMMA')
+                params.append(self.current_token.value)
+                self.eat('IDENT')
+        self.eat('RPAREN')
         declarations = self.declarations()
         self.eat('LBRACE')
-        statements = self.statement_sequence()
+        self.open_blocks.append('}')
+        try:
+            statements = self.statement_sequence()
+        finally:
+            self.open_blocks.pop()
         self.eat('RBRACE')
-        self.eat('END')
-        return Program(declarations, statements)
+        self.eat('SEMICOLON')
+        return FunctionDeclaration(name, params, (declarations, statements))
 
     def declarations(self):
         declarations = []
         while self.current_token and self.current_token.type == 'KEYWORD' and self.current_token.value == 'var':
-            self.eat('KEYWORD')
-            while self.current_token.type == 'IDENT':
-                var = self.current_token.value
-                self.eat('IDENT')
-                declarations.append(Declaration(var))
-                if self.current_token.type == 'COMMA':
-                    self.eat('COMMA')
-                else:
-                    break
-            self.eat('SEMICOLON')
+            start_pos = self.pos
+            try:
+                self.eat_keyword('var')
+                while self.current_token.type == 'IDENT':
+                    var = self.current_token.value
+                    self.eat('IDENT')
+                    declarations.append(Declaration(var))
+                    if self.current_token.type == 'COMMA':
+                        self.eat('COMMA')
+                    else:
+                        break
+                self.eat('SEMICOLON')
+            except ParseError:
+                self.synchronize(start_pos, self.pos, self.STOPPERS | {('LBRACE', '{')})
         return declarations
 
     def statement_sequence(self):
         statements = []
-        while self.current_token and self.current_token.type not in ('RBRACE', 'END', 'KEYWORD') or (self.current_token.type == 'KEYWORD' and self.current_token.value not in ('else', 'fi', 'od')):
-            statements.append(self.statement())
-            if self.current_token and self.current_token.type == 'SEMICOLON':
-                self.eat('SEMICOLON')
-        return statements
+        while True:
+            while self.current_token and self.current_token.type not in ('RBRACE', 'END', 'EOF') and not (self.current_token.type == 'KEYWORD' and self.current_token.value in ('else', 'fi', 'od')):
+                start_pos = self.pos
+                try:
+                    statements.append(self.statement())
+                except ParseError:
+                    self.synchronize(start_pos, self.pos, self.STOPPERS)
+                    continue
+                if self.current_token and self.current_token.type == 'SEMICOLON':
+                    self.eat('SEMICOLON')
+            if not (self.recover and self.is_stray(self.current_token)):
+                return statements
+            self.report(f"Unexpected {self.current_token}")
+            self.next_token()
+            if self.current_token.type == 'SEMICOLON':
+                self.next_token()
+
+    def is_stray(self, token):
+        # Whether a token that ends a statement sequence has no open block to end.
+        if token.type not in ('RBRACE', 'KEYWORD'):
+            return False
+        innermost = self.open_blocks[-1] if self.open_blocks else None
+        if token.value == 'else':
+            return innermost != 'fi'
+        if token.value in self.open_blocks:
+            return False
+        # A wrong 'fi'/'od' is left for end_block to accept in place of the innermost closer.
+        return token.value == '}' or innermost not in ('fi', 'od')
 
     def statement(self):
         if self.current_token.type == 'KEYWORD':
@@ -143,7 +315,7 @@ class Parser:
         self.error(f"Invalid statement: {self.current_token}")
 
     def assignment(self):
-        self.eat('KEYWORD')  # 'let'
+        self.eat_keyword('let')
         var = self.current_token.value
         self.eat('IDENT')
         self.eat('ASSIGN')
@@ -151,27 +323,57 @@ class Parser:
         return Assignment(var, expr)
 
     def if_statement(self):
-        self.eat('KEYWORD')  # 'if'
-        condition = self.relation()
-        self.eat('KEYWORD')  # 'then'
-        true_branch = self.statement_sequence()
-        false_branch = []
-        if self.current_token and self.current_token.type == 'KEYWORD' and self.current_token.value == 'else':
-            self.eat('KEYWORD')
-            false_branch = self.statement_sequence()
-        self.eat('KEYWORD')  # 'fi'
+        self.eat_keyword('if')
+        self.open_blocks.append('fi')
+        try:
+            condition = self.condition('then')
+            true_branch = self.statement_sequence()
+            false_branch = []
+            if self.current_token and self.current_token.type == 'KEYWORD' and self.current_token.value == 'else':
+                self.eat_keyword('else')
+                false_branch = self.statement_sequence()
+                while self.recover and self.current_token.type == 'KEYWORD' and self.current_token.value == 'else':
+                    # A repeated 'else' is a typo; its statements still belong to this branch.
+                    self.report(f"Unexpected {self.current_token}")
+                    self.next_token()
+                    false_branch.extend(self.statement_sequence())
+        finally:
+            self.open_blocks.pop()
+        self.end_block('fi')
         return IfStatement(condition, true_branch, false_branch)
 
+    def condition(self, keyword):
+        # A broken condition is skipped up to its 'then' or 'do' so the body is still checked.
+        try:
+            condition = self.relation()
+        except ParseError:
+            condition = None
+            while (self.current_token.type, self.current_token.value) not in self.STOPPERS | {('KEYWORD', keyword)}:
+                if self.current_token.type == 'SEMICOLON':
+                    raise
+                self.next_token()
+            if self.current_token.value != keyword:
+                raise
+        if self.recover and self.current_token.type == 'KEYWORD' and self.current_token.value in ('then', 'do') and self.current_token.value != keyword:
+            self.report(f"Expected keyword {keyword}, got {self.current_token}")
+            self.next_token()
+        else:
+            self.eat_keyword(keyword)
+        return condition
+
     def while_statement(self):
-        self.eat('KEYWORD')  # 'while'
-        condition = self.relation()
-        self.eat('KEYWORD')  # 'do'
-        body = self.statement_sequence()
-        self.eat('KEYWORD')  # 'od'
+        self.eat_keyword('while')
+        self.open_blocks.append('od')
+        try:
+            condition = self.condition('do')
+            body = self.statement_sequence()
+        finally:
+            self.open_blocks.pop()
+        self.end_block('od')
         return WhileStatement(condition, body)
 
     def return_statement(self):
-        self.eat('KEYWORD')  # 'return'
+        self.eat_keyword('return')
         expr = None
         if self.current_token.type != 'SEMICOLON':
             expr = self.expression()
@@ -182,7 +384,7 @@ class Parser:
         return func_call
 
     def function_call(self):
-        self.eat('KEYWORD')  # 'call'
+        self.eat_keyword('call')
         func_name = self.current_token.value
         self.eat('IDENT')
         self.eat('LPAREN')
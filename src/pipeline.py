@@ -0,0 +1,72 @@
+from tokenizer import Tokenizer
+from parser import Parser
+from ir_generator import IRGenerator
+
+def split_units(tokens):
+    """Groups a token stream into top-level units: each function, then main.
+
+    A function ends at the ';' after its body and main ends at its '.', so only one
+    unit's tokens are ever held at a time.
+    """
+    unit = []
+    depth = 0
+    seen_body = False
+    for token in tokens:
+        unit.append(token)
+        if token.type == 'LBRACE':
+            depth += 1
+            seen_body = True
+        elif token.type == 'RBRACE':
+            depth -= 1
+        elif depth == 0 and (token.type == 'END' or (token.type == 'SEMICOLON' and seen_body and unit[0].value == 'function')):
+            yield unit
+            unit = []
+            seen_body = False
+    if unit:
+        yield unit
+
+class StreamingCompiler:
+    """Parses, lowers and optimizes a program one function at a time.
+
+    `compile` is a generator of (name, IR) pairs in source order; once the caller has
+    emitted a unit and let go of it, nothing else refers to its AST or blocks. Across
+    units only the generator's counters and its table of function signatures survive.
+    """
+
+    def __init__(self, optimizer=None):
+        self.optimizer = optimizer
+        self.generator = IRGenerator()
+
+    @property
+    def signatures(self):
+        return self.generator.functions
+
+    def parse_unit(self, tokens):
+        parser = Parser(tokens)
+        if tokens[0].type == 'KEYWORD' and tokens[0].value == 'function':
+            node = parser.function_declaration()
+            name = node.name
+        else:
+            node = parser.program()
+            name = 'main'
+        if parser.current_token is not None:
+            parser.error(f"Unexpected token after {name}: {parser.current_token}")
+        return name, node
+
+    def compile(self, code):
+        seen_main = False
+        for tokens in split_units(Tokenizer(code).iter_tokens()):
+            if seen_main:
+                # Nothing may follow main's '.', so this is trailing input, not another unit.
+                Parser(tokens).error(f"Unexpected token after main: {tokens[0]}")
+            name, node = self.parse_unit(tokens)
+            seen_main = name == 'main'
+            # The loop variable would otherwise hold these until the next unit is split off.
+            del tokens
+            ir = self.generator.generate_unit(node)
+            del node
+            if self.optimizer:
+                self.optimizer.optimize(ir, whole_program=False)
+            yield name, ir
+            # Drop this unit before lowering the next one rather than when `ir` is rebound.
+            del ir
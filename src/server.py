@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from main import STAGES, compile_source, format_result
+
+DEFAULT_SOCKET = '/tmp/tiny_compiler.sock'
+# A whole batch arrives as one line, so the reader's buffer has to hold it.
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+WARMUP_CODE = """
+main
+var x; {
+    let x <- call InputNum();
+    if x == 1 then
+        let x <- 1
+    else
+        let x <- 2
+    fi;
+    call OutputNum(x)
+}.
+"""
+
+def compile_request(op, source):
+    # Runs in the server process or in a pool worker, so it only deals in plain data.
+    if op not in STAGES:
+        return {'ok': False, 'error': f"Unsupported op: {op}"}
+    try:
+        result = compile_source(source, op)
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'result': format_result(result, op)}
+
+def _warm_up():
+    # Pays the import and regex compilation cost once, before the first real request.
+    compile_request('ir', WARMUP_CODE)
+
+class ResultCache:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, op, source):
+        return op, hashlib.sha1(source.encode()).digest()
+
+    def get(self, op, source):
+        key = self.key(op, source)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, op, source, response):
+        key = self.key(op, source)
+        self.entries[key] = response
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+class CompileServer:
+    """Keeps the compiler resident and answers batched requests over a Unix socket.
+
+    Each request is one JSON line: {"id": ..., "op": "tokens"|"ast"|"ir", "sources": [...]}.
+    Every source gets its own response line as soon as it is ready, tagged with its
+    index in the batch, followed by a final {"id": ..., "done": true} line.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, workers=0, cache_size=1024):
+        self.path = path
+        self.workers = workers
+        self.cache = ResultCache(cache_size)
+        self.pool = None
+        self.server = None
+        self.clients = {}
+
+    async def start(self):
+        _warm_up()
+        if self.workers:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_warm_up)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path, limit=MAX_REQUEST_SIZE)
+        return self.server
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        # Closing the listener leaves connected clients running. Closing their transports
+        # ends them through the usual disconnect path; cancelling would be logged as an error.
+        for writer in list(self.clients.values()):
+            writer.close()
+        await asyncio.gather(*self.clients, return_exceptions=True)
+        if self.pool:
+            self.pool.shutdown()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self.clients[task] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await self.send(writer, {'ok': False, 'error': "Malformed request: larger than the request size limit", 'done': True})
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    await self.send(writer, {'ok': False, 'error': f"Malformed request: {e}", 'done': True})
+                    continue
+                error = self.validate(request)
+                if error:
+                    await self.send(writer, {'id': request.get('id') if isinstance(request, dict) else None,
+                                             'ok': False, 'error': f"Malformed request: {error}", 'done': True})
+                    continue
+                await self.handle_request(request, writer)
+        except ConnectionError:
+            # The client went away mid-stream; there is nobody left to answer.
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.clients.pop(task, None)
+
+    def validate(self, request):
+        if not isinstance(request, dict):
+            return "expected a JSON object"
+        if request.get('op', 'ir') not in STAGES:
+            return f"op must be one of {', '.join(STAGES)}"
+        if 'sources' in request:
+            sources = request['sources']
+            if not isinstance(sources, list) or not all(isinstance(source, str) for source in sources):
+                return "sources must be a list of strings"
+        elif not isinstance(request.get('source', ''), str):
+            return "source must be a string"
+        return None
+
+    async def handle_request(self, request, writer):
+        request_id = request.get('id')
+        op = request.get('op', 'ir')
+        sources = request.get('sources')
+        if sources is None:
+            sources = [request.get('source', '')]
+
+        async def respond(index, response):
+            await self.send(writer, dict(response, id=request_id, index=index))
+
+        pending = {}
+        loop = asyncio.get_running_loop()
+        for index, source in enumerate(sources):
+            response = self.cache.get(op, source)
+            if response is not None:
+                await respond(index, dict(response, cached=True))
+            else:
+                # Without a pool, compiles go to the loop's default thread pool so a large
+                # one doesn't stall every other client.
+                future = loop.run_in_executor(self.pool, compile_request, op, source)
+                pending[future] = (index, source)
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index, source = pending.pop(future)
+                response = future.result()
+                self.cache.put(op, source, response)
+                await respond(index, response)
+
+        await self.send(writer, {'id': request_id, 'done': True})
+
+    async def send(self, writer, message):
+        writer.write(json.dumps(message).encode() + b'\n')
+        await writer.drain()
+
+class CompileClient:
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rwb')
+        self.next_id = 0
+
+    def request(self, sources, op='ir'):
+        """Sends one batch and yields each response line as the server streams it."""
+        request_id = self.next_id
+        self.next_id += 1
+        self.file.write(json.dumps({'id': request_id, 'op': op, 'sources': sources}).encode() + b'\n')
+        self.file.flush()
+        for line in self.file:
+            response = json.loads(line)
+            if response.get('done'):
+                return
+            yield response
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def bench(path, code, runs):
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([sys.executable, main_script], input=code, text=True, capture_output=True, check=True)
+    cli_latency = (time.perf_counter() - start) / runs
+
+    client = CompileClient(path)
+    # Trailing newlines don't change the program but do change the cache key.
+    start = time.perf_counter()
+    for i in range(runs):
+        list(client.request([code + '\n' * i]))
+    cold_latency = (time.perf_counter() - start) / runs
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        list(client.request([code]))
+    warm_latency = (time.perf_counter() - start) / runs
+    client.close()
+
+    print(f"cli spawn:           {cli_latency * 1000:8.3f} ms/request")
+    print(f"server (cache miss): {cold_latency * 1000:8.3f} ms/request")
+    print(f"server (cache hit):  {warm_latency * 1000:8.3f} ms/request")
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Resident compile server.")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="run the server")
+    serve_parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    serve_parser.add_argument('--workers', type=int, default=0, help="size of the worker process pool (0 compiles on threads in the server process)")
+    serve_parser.add_argument('--cache-size', type=int, default=1024)
+
+    bench_parser = commands.add_parser('bench', help="compare server latency with spawning the CLI")
+    bench_parser.add_argument('file', nargs='?', help="source file (defaults to a small sample program)")
+    bench_parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    bench_parser.add_argument('-n', '--runs', type=int, default=50)
+
+    args = arg_parser.parse_args(argv)
+    if args.command == 'serve':
+        server = CompileServer(args.socket, args.workers, args.cache_size)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+    else:
+        code = WARMUP_CODE
+        if args.file:
+            with open(args.file) as f:
+                code = f.read()
+        bench(args.socket, code, args.runs)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
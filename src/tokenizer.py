@@ -1,3 +1,4 @@
+import io
 import re
 
 class Token:
@@ -10,11 +11,25 @@ class Token:
     def __repr__(self):
         return f"Token({self.type}, {self.value}, {self.line}, {self.column})"
 
+class Diagnostic:
+    def __init__(self, message, line, column):
+        self.message = message
+        self.line = line
+        self.column = column
+
+    def __repr__(self):
+        return f"Diagnostic({self.message!r}, {self.line}, {self.column})"
+
+    def __str__(self):
+        return f"{self.line}:{self.column}: {self.message}"
+
 class Tokenizer:
-    def __init__(self, code):
+    def __init__(self, code, recover=False):
         self.code = code
+        self.recover = recover
         self.tokens = []
-        self.keywords = {'let', 'if', 'then', 'else', 'fi', 'while', 'do', 'od', 'call', 'main', 'var'}
+        self.errors = []
+        self.keywords = {'let', 'if', 'then', 'else', 'fi', 'while', 'do', 'od', 'call', 'main', 'var', 'function', 'return'}
         self.token_specification = [
             ('NUMBER',   r'\d+'),
             ('ASSIGN',   r'<-'),
@@ -34,28 +49,36 @@ class Tokenizer:
         ]
 
     def tokenize(self):
-        tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in self.token_specification)
-        line_num = 1
-        line_start = 0
-        for mo in re.finditer(tok_regex, self.code):
-            kind = mo.lastgroup
-            value = mo.group()
-            column = mo.start() - line_start
-            if kind == 'NUMBER':
-                value = int(value)
-            elif kind == 'IDENT' and value in self.keywords:
-                kind = 'KEYWORD'
-            elif kind == 'NEWLINE':
-                line_start = mo.end()
-                line_num += 1
-                continue
-            elif kind == 'SKIP':
-                continue
-            elif kind == 'MISMATCH':
-                raise RuntimeError(f'{value!r} unexpected on line {line_num}')
-            self.tokens.append(Token(kind, value, line_num, column))
+        for token in self.iter_tokens():
+            self.tokens.append(token)
         return self.tokens
 
+    def iter_tokens(self):
+        """Yields tokens one at a time; `code` may be a string or any iterable of lines.
+
+        No token spans a newline, so scanning a line at a time never needs more of the
+        source in memory than the current line.
+        """
+        tok_regex = re.compile('|'.join('(?P<%s>%s)' % pair for pair in self.token_specification))
+        lines = io.StringIO(self.code, newline='\n') if isinstance(self.code, str) else self.code
+        for line_num, line in enumerate(lines, 1):
+            for mo in tok_regex.finditer(line):
+                kind = mo.lastgroup
+                value = mo.group()
+                column = mo.start()
+                if kind == 'NUMBER':
+                    value = int(value)
+                elif kind == 'IDENT' and value in self.keywords:
+                    kind = 'KEYWORD'
+                elif kind in ('NEWLINE', 'SKIP'):
+                    continue
+                elif kind == 'MISMATCH':
+                    if self.recover:
+                        self.errors.append(Diagnostic(f'{value!r} unexpected', line_num, column))
+                        continue
+                    raise RuntimeError(f'{value!r} unexpected on line {line_num}')
+                yield Token(kind, value, line_num, column)
+
 if __name__ == "__main__":
     code = """
     main
@@ -0,0 +1,86 @@
+import unittest
+from ir import IR, BasicBlock, Instruction
+from optimizer import PeepholeOptimizer, Rule
+
+
+def block(label, *instructions):
+    result = BasicBlock(label)
+    result.instructions = list(instructions)
+    return result
+
+
+def ir_of(*blocks):
+    result = IR()
+    result.basic_blocks = list(blocks)
+    return result
+
+
+class TestPeepholeOptimizer(unittest.TestCase):
+
+    def test_algebraic_identities(self):
+        ir = ir_of(block('BB0',
+            Instruction('assign', 'a', Instruction('+', 'x', 0)),
+            Instruction('assign', 'b', Instruction('*', 1, 'x')),
+            Instruction('assign', 'c', Instruction('*', 'x', 8)),
+            Instruction('assign', 'd', Instruction('*', 'x', 6)),
+        ))
+        optimizer = PeepholeOptimizer()
+        optimizer.optimize(ir)
+        self.assertEqual(repr(ir.basic_blocks[0].instructions), repr([
+            Instruction('assign', 'a', 'x'),
+            Instruction('assign', 'b', 'x'),
+            Instruction('assign', 'c', Instruction('<<', 'x', 3)),
+            Instruction('assign', 'd', Instruction('*', 'x', 6)),
+        ]))
+        self.assertEqual(optimizer.stats, {'add-zero': 1, 'one-mul': 1, 'mul-pow2': 1})
+
+    def test_copy_folding_runs_to_fixed_point(self):
+        ir = ir_of(block('BB0',
+            Instruction('assign', '%t0', Instruction('*', 'x', 1)),
+            Instruction('assign', 'x', '%t0'),
+            Instruction('assign', '%t1', Instruction('==', 'x', 1)),
+            Instruction('assign', '%t2', '%t1'),
+            Instruction('br', '%t2', 'BB1', 'BB2'),
+        ))
+        optimizer = PeepholeOptimizer()
+        optimizer.optimize(ir)
+        self.assertEqual(repr(ir.basic_blocks[0].instructions), repr([
+            Instruction('assign', '%t2', Instruction('==', 'x', 1)),
+            Instruction('br', '%t2', 'BB1', 'BB2'),
+        ]))
+        self.assertEqual(optimizer.stats, {'fold-copy': 2, 'mul-one': 1, 'self-assign': 1})
+
+    def test_copy_of_reused_value_is_kept(self):
+        instructions = [
+            Instruction('assign', '%t0', Instruction('+', 'x', 'y')),
+            Instruction('assign', 'z', '%t0'),
+            Instruction('call', 'OutputNum', '%t0'),
+        ]
+        ir = ir_of(block('BB0', *instructions))
+        PeepholeOptimizer().optimize(ir)
+        self.assertEqual(len(ir.basic_blocks[0].instructions), 3)
+
+    def test_jump_to_next_block_is_removed(self):
+        ir = ir_of(
+            block('BB0', Instruction('jmp', 'BB1')),
+            block('BB1', Instruction('jmp', 'BB0')),
+        )
+        optimizer = PeepholeOptimizer()
+        optimizer.optimize(ir)
+        self.assertEqual(ir.basic_blocks[0].instructions, [])
+        self.assertEqual(len(ir.basic_blocks[1].instructions), 1)
+        self.assertEqual(optimizer.stats, {'jmp-next': 1})
+
+    def test_rules_are_indexed_by_opcode(self):
+        add = Rule('add', [('assign', '?d', ('+', '?a', 0))], [('assign', '?d', '?a')])
+        copy = Rule('copy', [('assign', '?d', '?d')], [])
+        jump = Rule('jump', [('jmp', '?l')], [])
+        optimizer = PeepholeOptimizer([add, copy, jump])
+        self.assertEqual(optimizer.candidates(Instruction('assign', 'x', Instruction('+', 'y', 0))), [add, copy])
+        self.assertEqual(optimizer.candidates(Instruction('assign', 'x', Instruction('*', 'y', 2))), [copy])
+        self.assertEqual(optimizer.candidates(Instruction('jmp', 'BB1')), [jump])
+        self.assertEqual(optimizer.candidates(Instruction('ret')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from tokenizer import Tokenizer
+from parser import Parser, Program, IfStatement, WhileStatement
+
+
+def check(code):
+    tokenizer = Tokenizer(code, recover=True)
+    parser = Parser(tokenizer.tokenize(), recover=True)
+    ast = parser.parse()
+    return ast, tokenizer.errors, parser.errors
+
+
+class TestParserRecovery(unittest.TestCase):
+
+    def test_valid_input_has_no_diagnostics(self):
+        code = """
+        main
+        var x; {
+            let x <- call InputNum();
+            if x == 1 then
+                let x <- 1
+            else
+                let x <- 2
+            fi;
+            call OutputNum(x)
+        }.
+        """
+        ast, token_errors, parse_errors = check(code)
+        self.assertEqual(token_errors, [])
+        self.assertEqual(parse_errors, [])
+        self.assertEqual(repr(ast), repr(Parser(Tokenizer(code).tokenize()).parse()))
+
+    def test_reports_every_error_in_one_pass(self):
+        code = """
+        main
+        var x y; {
+            let x <- $ 1;
+            if x < then
+                let x <- 2;
+                while x < 3 do let x <- od
+            fi;
+            let <- 4;
+            call OutputNum(x)
+        }.
+        """
+        ast, token_errors, parse_errors = check(code)
+        self.assertEqual([(e.line, e.column) for e in token_errors], [(4, 21)])
+        self.assertEqual([(e.line, e.column) for e in parse_errors], [(3, 14), (5, 19), (7, 40), (9, 16)])
+        self.assertIsInstance(ast, Program)
+        if_statement = ast.statements[1]
+        self.assertIsInstance(if_statement, IfStatement)
+        self.assertIsNone(if_statement.condition)
+        self.assertIsInstance(if_statement.true_branch[1], WhileStatement)
+        self.assertEqual(repr(ast.statements[-1]), "FunctionCall(func_name=OutputNum, args=['x'])")
+
+    def test_unterminated_if_does_not_swallow_block(self):
+        ast, _, parse_errors = check("main var x; { if x < 1 then let x <- 1 ; let x <- 2 }.")
+        self.assertEqual(len(parse_errors), 1)
+        self.assertIn('Expected keyword fi', parse_errors[0].message)
+        self.assertEqual(len(ast.statements[0].true_branch), 2)
+
+    def test_mismatched_closers(self):
+        ast, _, parse_errors = check("main var x; { if x < 1 then let x <- 1 od; while x < 2 then let x <- 3 fi }.")
+        self.assertEqual([(e.message.split(',')[0], e.column) for e in parse_errors],
+                         [('Expected keyword fi', 39), ('Expected keyword do', 55), ('Expected keyword od', 71)])
+        self.assertIsInstance(ast.statements[0], IfStatement)
+        self.assertIsInstance(ast.statements[1], WhileStatement)
+
+    def test_closer_of_enclosing_block_is_not_taken(self):
+        ast, _, parse_errors = check("main var x; { while x < 1 do if x < 2 then let x <- 1 od }.")
+        self.assertEqual([e.message.split(',')[0] for e in parse_errors], ['Expected keyword fi'])
+        self.assertIsInstance(ast.statements[0].body[0], IfStatement)
+
+    def test_stray_closers_do_not_end_the_pass(self):
+        ast, _, parse_errors = check("main { let x <- 1; fi; let <- 2; let y <- }.")
+        self.assertEqual([(e.message.split(',')[0], e.column) for e in parse_errors],
+                         [('Unexpected Token(KEYWORD', 19), ('Expected token IDENT', 27), ('Invalid factor: Token(RBRACE', 42)])
+
+    def test_extra_closing_brace(self):
+        ast, _, parse_errors = check("main var x; { let x <- 1 } let y <- 2 }.")
+        self.assertEqual([(e.message, e.column) for e in parse_errors], [("Unexpected Token(RBRACE, }, 1, 25)", 25)])
+        self.assertEqual(len(ast.statements), 2)
+
+    def test_missing_end_reported_only_at_end_of_input(self):
+        _, _, parse_errors = check("main var x; { let x <- 1 }")
+        self.assertEqual([e.message for e in parse_errors], ["Expected token END, got Token(EOF, None, 1, 25)"])
+
+    def test_doubled_else(self):
+        ast, _, parse_errors = check("main var x; { if x < 1 then let x <- 1 else else let x <- 2 fi; let <- 3 }.")
+        self.assertEqual([(e.message.split(',')[0], e.column) for e in parse_errors],
+                         [('Unexpected Token(KEYWORD', 44), ('Expected token IDENT', 68)])
+        self.assertIsInstance(ast.statements[0], IfStatement)
+        self.assertEqual(repr(ast.statements[0].false_branch), "[Assignment(var='x', expr=2)]")
+
+    def test_code_after_end_of_program(self):
+        ast, _, parse_errors = check("main var x; { let x <- 1 }.\nlet <- 2")
+        self.assertEqual([(e.message, e.line, e.column) for e in parse_errors],
+                         [("Unexpected token after end of program: Token(KEYWORD, let, 2, 0)", 2, 0)])
+        self.assertEqual(repr(ast.statements), "[Assignment(var='x', expr=1)]")
+
+    def test_missing_main(self):
+        ast, _, parse_errors = check("var x; { let x <- 1 }.")
+        self.assertEqual([e.message.split(',')[0] for e in parse_errors], ['Expected keyword main'])
+        self.assertEqual(repr(ast), "Program(declarations=[Declaration(var='x')], statements=[Assignment(var='x', expr=1)])")
+
+    def test_truncated_input(self):
+        ast, _, parse_errors = check("main { let x <- 1")
+        self.assertEqual(repr(ast.statements), "[Assignment(var='x', expr=1)]")
+        self.assertEqual([e.message.split(',')[0] for e in parse_errors], ['Expected token RBRACE', 'Expected token END'])
+
+    def test_default_mode_still_raises(self):
+        with self.assertRaises(RuntimeError):
+            Tokenizer("main { let x <- $ }.").tokenize()
+        with self.assertRaises(Exception):
+            Parser(Tokenizer("main { let <- 1 }.").tokenize()).parse()
+        with self.assertRaises(Exception):
+            Parser(Tokenizer("main var x; { if x < 1 then let x <- 1 od }.").tokenize()).parse()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import gc
+import unittest
+import weakref
+from tokenizer import Tokenizer
+from parser import Parser, FunctionDeclaration
+from ir_generator import IRGenerator
+from optimizer import PeepholeOptimizer
+from pipeline import StreamingCompiler, split_units
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.code = """
+        function add(a, b) var c; {
+            let c <- a + b;
+            return c
+        };
+        function twice(a) {
+            if a > 0 then let a <- a + a fi;
+            return a
+        };
+        main
+        var x; {
+            let x <- call add(1, 2);
+            call OutputNum(call twice(x))
+        }.
+        """
+
+    def test_parse_functions(self):
+        program = Parser(Tokenizer(self.code).tokenize()).parse()
+        self.assertEqual([f.name for f in program.functions], ['add', 'twice'])
+        add = program.functions[0]
+        self.assertIsInstance(add, FunctionDeclaration)
+        self.assertEqual(add.params, ['a', 'b'])
+        self.assertEqual(repr(add.body), "([Declaration(var='c')], [Assignment(var='c', expr=Expression(left=a, op=+, right=b)), ReturnStatement(expr=c)])")
+
+    def test_split_units(self):
+        units = list(split_units(Tokenizer(self.code).iter_tokens()))
+        self.assertEqual([unit[0].value for unit in units], ['function', 'function', 'main'])
+        self.assertEqual([unit[-1].type for unit in units], ['SEMICOLON', 'SEMICOLON', 'END'])
+
+    def test_streamed_ir_matches_whole_program(self):
+        whole = IRGenerator().generate(Parser(Tokenizer(self.code).tokenize()).parse())
+        compiler = StreamingCompiler()
+        names, blocks = [], []
+        for name, ir in compiler.compile(self.code):
+            names.append(name)
+            blocks.extend(ir.basic_blocks)
+        self.assertEqual(names, ['add', 'twice', 'main'])
+        self.assertEqual(repr(blocks), repr(whole.basic_blocks))
+        self.assertEqual(repr(compiler.signatures['twice']), "FunctionSignature(name=twice, params=['a'], entry=BB1)")
+
+    def test_optimized_stream_matches_optimized_whole_program(self):
+        programs = [
+            self.code,
+            # A function reading a global that main stores to.
+            "function f() { call OutputNum(g) }; main var g, h; { let g <- 5; let h <- g; call f() }.",
+            # A function storing to a global that main reads.
+            "function f() { let g <- 5; let h <- g }; main var g, h; { call f(); call OutputNum(g) }.",
+            # A global whose name looks like a generated temp.
+            "function f() { let t7 <- 5 * 2; let h <- t7 }; main var h, t7; { call f(); call OutputNum(t7) }.",
+        ]
+        for code in programs:
+            whole = IRGenerator().generate(Parser(Tokenizer(code).tokenize()).parse())
+            PeepholeOptimizer().optimize(whole)
+            streamed = [block for _, ir in StreamingCompiler(PeepholeOptimizer()).compile(code) for block in ir.basic_blocks]
+            self.assertEqual(repr(streamed), repr(whole.basic_blocks))
+
+    def test_previous_unit_is_released(self):
+        compiler = StreamingCompiler(PeepholeOptimizer())
+        previous = []
+        for name, ir in compiler.compile(self.code):
+            gc.collect()
+            for ref in previous:
+                self.assertIsNone(ref(), f"a unit before {name} is still alive")
+            previous = [weakref.ref(ir)] + [weakref.ref(block) for block in ir.basic_blocks]
+            del ir
+        self.assertIsNone(compiler.generator.ir)
+        self.assertIsNone(compiler.generator.current_block)
+
+    def test_tokenizes_line_iterables(self):
+        lines = self.code.splitlines(keepends=True)
+        expected = [(t.type, t.value, t.line, t.column) for t in Tokenizer(self.code).tokenize()]
+        actual = [(t.type, t.value, t.line, t.column) for t in Tokenizer(iter(lines)).iter_tokens()]
+        self.assertEqual(actual, expected)
+
+    def test_trailing_tokens_are_rejected(self):
+        with self.assertRaises(Exception):
+            list(StreamingCompiler().compile("function f() { return 1 } ; x; main { }."))
+
+    def test_code_after_main_is_trailing_input(self):
+        units = StreamingCompiler().compile("main var x; { let x <- 1 }.\nlet <- 2")
+        self.assertEqual(next(units)[0], 'main')
+        with self.assertRaisesRegex(Exception, r"Unexpected token after main: Token\(KEYWORD, let, 2, 0\)"):
+            next(units)
+
+
+if __name__ == '__main__':
+    unittest.main()
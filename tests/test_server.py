@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from server import CompileServer, CompileClient, ResultCache, WARMUP_CODE
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'compile.sock')
+
+    def run_batches(self, batches, workers=0):
+        server = CompileServer(self.path, workers=workers)
+
+        async def run():
+            await server.start()
+            try:
+                def talk():
+                    client = CompileClient(self.path)
+                    responses = [list(client.request(sources, op)) for op, sources in batches]
+                    client.close()
+                    return responses
+                return await asyncio.get_running_loop().run_in_executor(None, talk)
+            finally:
+                await server.close()
+
+        return asyncio.run(run()), server
+
+    def test_batch_is_streamed_and_cached(self):
+        bad = "main { let x <- $ }."
+        (first, second), server = self.run_batches([('ir', [WARMUP_CODE, bad]), ('ir', [WARMUP_CODE])])
+        by_index = {response['index']: response for response in first}
+        self.assertTrue(by_index[0]['ok'])
+        self.assertIn('BB0', by_index[0]['result'])
+        self.assertFalse(by_index[1]['ok'])
+        self.assertIn("'$' unexpected", by_index[1]['error'])
+        self.assertTrue(second[0]['cached'])
+        self.assertEqual(second[0]['result'], by_index[0]['result'])
+        self.assertEqual(server.cache.hits, 1)
+
+    def test_worker_pool(self):
+        (responses,), _ = self.run_batches([('tokens', [WARMUP_CODE, "main {}."])], workers=2)
+        self.assertEqual(sorted(response['index'] for response in responses), [0, 1])
+        self.assertTrue(all(response['ok'] for response in responses))
+
+    def talk_raw(self, server, lines, expected):
+        async def run():
+            await server.start()
+            try:
+                def talk():
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.path)
+                    f = sock.makefile('rwb')
+                    f.write(b'\n'.join(lines) + b'\n')
+                    f.flush()
+                    responses = [json.loads(f.readline()) for _ in range(expected)]
+                    f.close()
+                    sock.close()
+                    return responses
+                return await asyncio.get_running_loop().run_in_executor(None, talk)
+            finally:
+                await server.close()
+
+        return asyncio.run(run())
+
+    def test_malformed_requests_get_an_error_line(self):
+        lines = [b'not json', b'[1, 2]', b'{"sources": [5]}', b'{"sources": "main {}."}', b'{"op": "run"}',
+                 b'{"id": 7, "source": "main {}."}']
+        responses = self.talk_raw(CompileServer(self.path), lines, len(lines) + 1)
+        for response in responses[:5]:
+            self.assertFalse(response['ok'])
+            self.assertTrue(response['done'])
+            self.assertIn('Malformed request', response['error'])
+        self.assertTrue(responses[5]['ok'])
+        self.assertEqual(responses[6], {'id': 7, 'done': True})
+
+    def test_client_disconnecting_mid_stream(self):
+        server = CompileServer(self.path)
+        errors = []
+
+        async def run():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            await server.start()
+            try:
+                def hang_up():
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.path)
+                    sources = [WARMUP_CODE + '\n' * i for i in range(200)]
+                    sock.sendall(json.dumps({'sources': sources}).encode() + b'\n')
+                    sock.close()
+                await asyncio.get_running_loop().run_in_executor(None, hang_up)
+                await asyncio.sleep(0.2)
+                client = CompileClient(self.path)
+                responses = await asyncio.get_running_loop().run_in_executor(None, lambda: list(client.request([WARMUP_CODE])))
+                client.close()
+                return responses
+            finally:
+                await server.close()
+
+        responses = asyncio.run(run())
+        self.assertTrue(responses[0]['ok'])
+        self.assertEqual(errors, [])
+
+    def test_large_compile_does_not_block_other_clients(self):
+        server = CompileServer(self.path)
+        large = "main var x; {\n" + "let x <- x + 1;\n" * 50000 + "call OutputNum(x)\n}."
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(server.start())
+        serving = threading.Thread(target=loop.run_forever)
+        serving.start()
+        elapsed = {}
+
+        def compile_batch(name, sources):
+            start = time.perf_counter()
+            client = CompileClient(self.path)
+            list(client.request(sources))
+            client.close()
+            elapsed[name] = time.perf_counter() - start
+
+        try:
+            compile_batch('warm', [WARMUP_CODE])
+            slow = threading.Thread(target=compile_batch, args=('large', [large]))
+            slow.start()
+            time.sleep(0.3)
+            compile_batch('small', [WARMUP_CODE])
+            slow.join()
+        finally:
+            asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            serving.join()
+            loop.close()
+        # The small request starts while the large one is compiling and must not wait it out.
+        self.assertLess(elapsed['small'], elapsed['large'] / 4)
+
+    def test_cache_evicts_oldest(self):
+        cache = ResultCache(max_size=2)
+        cache.put('ir', 'a', 1)
+        cache.put('ir', 'b', 2)
+        cache.get('ir', 'a')
+        cache.put('ir', 'c', 3)
+        self.assertIsNone(cache.get('ir', 'b'))
+        self.assertEqual(cache.get('ir', 'a'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()